@@ -1,9 +1,16 @@
+import json
+import os
+import threading
 import streamlit as st
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyarrow import csv as pacsv
 import plotly.express as px
-import geopandas as gpd
-import folium
-from streamlit_folium import st_folium
+import plotly.graph_objects as go
+from tsdownsample import MinMaxLTTBDownsampler
 
 # --- PAGE SETUP & CONSTANTS ---
 st.set_page_config(
@@ -42,6 +49,12 @@ if not check_password():
 
 # Define the overall project target and the lists of villages by type
 OVERALL_TARGET = 120
+RAW_DATA_PREVIEW_ROWS = 1000
+MAX_DAILY_BARS = 400  # Longer ranges are bucketed into weeks for the bar chart
+MAX_LAND_USE_TYPES = 30  # Only the most frequent land use types are charted
+MAX_LINE_POINTS = 3000  # Longer cumulative series are LTTB-downsampled to LINE_DOWNSAMPLE_POINTS
+LINE_DOWNSAMPLE_POINTS = 2000
+SELECTION_CACHE_ENTRIES = 32  # Per-selection caches keep the most recent filter combinations only
 CERTIFIED_VILLAGES = [
     'ALTO ANDINO', 'ALTO RIOJA', 'DINAMARCA', 'FLOR DE MAYO',
     'FLOR DE PRIMAVERA', 'GERVACIO', 'HUICUNGO', 'MONTE RICO',
@@ -51,83 +64,479 @@ PROJECT_VILLAGES = [
     'VISTA ALEGRE', 'CHUMBAQUIHUI', 'KACHIPAMPA'
 ]
 ALL_VILLAGES = sorted(CERTIFIED_VILLAGES + PROJECT_VILLAGES)
+CERTIFIED_VILLAGES_SET = frozenset(CERTIFIED_VILLAGES)
+PROJECT_VILLAGES_SET = frozenset(PROJECT_VILLAGES)
+VILLAGE_OPTIONS = ['All'] + ALL_VILLAGES
+
+# Village type lookup, built once instead of on every rerun
+VILLAGE_TYPE_MAP = {village: 'Certified' for village in CERTIFIED_VILLAGES}
+VILLAGE_TYPE_MAP.update({village: 'Project' for village in PROJECT_VILLAGES})
+# Categories are listed in the order the village summary table shows them
+VILLAGE_DTYPE = pd.CategoricalDtype(categories=list(VILLAGE_TYPE_MAP))
+
+# The survey CSV is converted once to Parquet, which is what sessions actually read
+SURVEY_CSV_PATH = 'Raw_data.csv'
+SURVEY_PARQUET_PATH = 'Raw_data.parquet'
+# Parquet metadata key recording the CSV modification time the copy was built from
+SURVEY_PARQUET_MTIME_KEY = b'source_csv_mtime'
+SURVEY_COLUMNS = ('Date', 'Village')  # All the dashboard itself needs; the raw-data view loads the rest
+# Explicit formats for text survey dates, tried in order; the first with the fewest failures wins,
+# so genuinely ambiguous exports are read day first as before. If even the best leaves most dates
+# unparsed, pandas' day-first inference is used instead
+SURVEY_DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y')
+GPS_CSV_PATH = 'gps_raw.csv'
+MAP_ZIP_PATH = 'Polygons_Shapefile.zip'
+# Polygons are drawn over satellite tiles; ~1 m of simplification and 6 decimals of
+# coordinate precision (in degrees) are below what the map can show
+MAP_SIMPLIFY_TOLERANCE = 1e-5
+MAP_COORDINATE_PRECISION = 1e-6
+# Leaflet draws every polygon as an SVG element; larger selections are drawn with pydeck (WebGL)
+MAX_FOLIUM_POLYGONS = 2000
 
 
 # --- DATA LOADING FUNCTIONS ---
-def load_survey_data():
-    """Loads the main farmer survey data."""
+def file_mtime(path):
+    """Returns the file's modification time, or None if it doesn't exist (used as a cache key)."""
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+def parse_survey_dates(dates):
+    """Parses an Arrow date column to nanosecond timestamps; unparseable values become null."""
+    if pa.types.is_timestamp(dates.type) or pa.types.is_date(dates.type):
+        # Arrow's CSV reader already recognised ISO dates
+        return dates.cast(pa.timestamp('ns'))
+
+    dates = dates.cast(pa.string())
+    best = None
+    for date_format in SURVEY_DATE_FORMATS:
+        parsed = pc.strptime(dates, format=date_format, unit='ns', error_is_null=True)
+        if best is None or parsed.null_count < best.null_count:
+            best = parsed
+        if best.null_count == dates.null_count:
+            break  # Every non-empty value parsed
+    values_present = len(dates) - dates.null_count
+    if best.null_count - dates.null_count > values_present / 2:
+        # None of the explicit formats fit (e.g. Excel adds a time of day); let pandas infer the format
+        fallback = pd.to_datetime(dates.to_pandas(), dayfirst=True, errors='coerce')
+        return pa.Array.from_pandas(fallback.astype('datetime64[ns]'))
+    return best
+
+def read_survey_csv():
+    """Reads and cleans the main farmer survey data from the raw CSV."""
+    # Arrow's multithreaded reader parses the CSV; dates are converted in C++ as well.
+    # Blank cells are read as null, not '', so they show as missing and don't count as unparsed dates
+    table = pacsv.read_csv(
+        SURVEY_CSV_PATH,
+        read_options=pacsv.ReadOptions(use_threads=True),
+        convert_options=pacsv.ConvertOptions(strings_can_be_null=True)
+    )
+    column_map = {
+        'Date': ['today', 'Date', 'date', 'Fecha'],
+        'Village': ['village', 'Village', 'Aldea', 'Comunidad']
+    }
+    available_columns = set(table.column_names)
+    found_columns = {
+        target_name: next((name for name in possible_names if name in available_columns), None)
+        for target_name, possible_names in column_map.items()
+    }
+    if None in found_columns.values():
+        raise FileNotFoundError(f"Survey data error: Required columns not found. Found: {table.column_names}")
+
+    rename_dict = {v: k for k, v in found_columns.items()}
+    table = table.rename_columns([rename_dict.get(name, name) for name in table.column_names])
+    date_index = table.column_names.index('Date')
+    table = table.set_column(date_index, 'Date', parse_survey_dates(table['Date']))
+    village_index = table.column_names.index('Village')
+    # Dictionary-encoded, so pandas (and the Parquet copy) get a categorical, not per-row strings
+    villages = pc.utf8_upper(table['Village'].cast(pa.string())).dictionary_encode()
+    table = table.set_column(village_index, 'Village', villages)
+    df = table.to_pandas()
+    df.dropna(subset=['Date'], inplace=True)
+    return df
+
+def read_survey_parquet(csv_mtime, columns):
+    """Reads the Parquet copy, or returns None if it is missing, unreadable or built from another CSV version."""
     try:
-        df = pd.read_csv('Raw_data.csv')
-        column_map = {
-            'Date': ['today', 'Date', 'date', 'Fecha'],
-            'Village': ['village', 'Village', 'Aldea', 'Comunidad']
-        }
-        found_columns = {}
-        for target_name, possible_names in column_map.items():
-            for name in possible_names:
-                if name in df.columns:
-                    found_columns[target_name] = name
-                    break
-        if 'Date' not in found_columns or 'Village' not in found_columns:
-            raise FileNotFoundError(f"Survey data error: Required columns not found. Found: {df.columns.tolist()}")
-        
-        rename_dict = {v: k for k, v in found_columns.items()}
-        df.rename(columns=rename_dict, inplace=True)
-        df['Date'] = pd.to_datetime(df['Date'], dayfirst=True, errors='coerce')
-        df['Village'] = df['Village'].str.upper()
-        df.dropna(subset=['Date'], inplace=True)
-        return df
-    except FileNotFoundError as e:
-        # Raise the exception to be caught by the session state loader
-        raise e
-
-def load_gps_data():
-    """Loads the land use GPS data."""
+        # An exact match, not "newer than": a replaced CSV can keep an old mtime (cp -p, rsync -a)
+        metadata = pq.read_schema(SURVEY_PARQUET_PATH).metadata or {}
+        if metadata.get(SURVEY_PARQUET_MTIME_KEY) != repr(csv_mtime).encode():
+            return None
+        return pd.read_parquet(
+            SURVEY_PARQUET_PATH, engine='pyarrow', columns=list(columns) if columns is not None else None
+        )
+    except (OSError, pa.ArrowException):
+        # A truncated or corrupt copy is rebuilt from the CSV rather than failing every load
+        return None
+
+def write_survey_parquet(df, csv_mtime):
+    """Writes the Parquet copy via a temporary file, so an interrupted write never leaves a partial copy."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), SURVEY_PARQUET_MTIME_KEY: repr(csv_mtime).encode()}
+    table = table.replace_schema_metadata(metadata)
+    # Same directory as the final copy, so os.replace is an atomic rename; unique per writer thread
+    temp_path = f'{SURVEY_PARQUET_PATH}.{os.getpid()}.{threading.get_ident()}.tmp'
     try:
-        df_gps = pd.read_csv('gps_raw.csv')
-        if 'type' not in df_gps.columns:
+        pq.write_table(table, temp_path, compression='zstd')
+        os.replace(temp_path, SURVEY_PARQUET_PATH)
+    except OSError:
+        # Read-only deployments can't keep the Parquet copy; the parsed CSV is served instead.
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+# Bounded so superseded versions of the data don't stay in memory (one dashboard frame, one full frame)
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_survey_data(csv_mtime, columns=SURVEY_COLUMNS):
+    """Loads the main farmer survey data, rebuilding the Parquet copy if it doesn't match the CSV.
+
+    `csv_mtime` is the CSV modification time; it keys the cache so edits to the file reload it.
+    Only `columns` are read from the Parquet copy; pass None for every column (the raw-data view).
+    The frame is shared by every session, so callers must treat it as read-only.
+    """
+    df = read_survey_parquet(csv_mtime, columns)
+    if df is None:
+        df = read_survey_csv()
+        write_survey_parquet(df, csv_mtime)
+        if columns is not None:
+            df = df[list(columns)].copy()
+
+    if columns is not None:
+        # Recode the dashboard frame onto the fixed village list, so filters and groupbys work on small
+        # integer codes. The raw-data frame keeps unknown villages as read, so bad values stay visible
+        df['Village'] = df['Village'].astype(VILLAGE_DTYPE)
+    # Sorted dates turn every date-range filter into a searchsorted slice
+    df.sort_values('Date', inplace=True, kind='mergesort')
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_survey_cube(csv_mtime):
+    """Collapses the survey rows into one count per (day, village) pair."""
+    df = load_survey_data(csv_mtime)
+    # dropna=False keeps surveys from villages outside ALL_VILLAGES in the overall totals
+    # The day key is grouped on directly, rather than assigned as a column of a copied frame
+    cube = (
+        df.groupby([df['Date'].dt.floor('D').rename('Day'), 'Village'], observed=True, dropna=False)
+        .size()
+        .rename('Count')
+        .reset_index()
+    )
+    # Running total over the day-sorted cube: any date range's survey count is a difference of two entries
+    cube['Running'] = cube['Count'].to_numpy().cumsum()
+    return cube
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_village_type_masks(csv_mtime):
+    """Returns boolean masks over the survey rows for each village type filter, keyed like the sidebar radio."""
+    villages = load_survey_data(csv_mtime)['Village']
+    return {
+        'Certified Villages': villages.isin(CERTIFIED_VILLAGES_SET).to_numpy(),
+        'Project Villages': villages.isin(PROJECT_VILLAGES_SET).to_numpy(),
+    }
+
+@st.cache_data(show_spinner=False)
+def load_gps_data(gps_mtime):
+    """Loads the land use GPS data. `gps_mtime` only keys the cache."""
+    try:
+        # Arrow's multithreaded reader, limited to the one column the dashboard uses
+        try:
+            df_gps = pd.read_csv(GPS_CSV_PATH, engine='pyarrow', usecols=['type'], dtype={'type': 'string'})
+        except pa.ArrowKeyError:
+            # Arrow raises this when a usecols column is not in the file
             raise FileNotFoundError("Error: The 'gps_raw.csv' file must contain a column named 'type'.")
         df_gps['Land Use Type'] = df_gps['type'].str.replace('_', ' ').str.title()
         return df_gps
     except FileNotFoundError:
         return None
 
-def load_map_data():
-    """Loads the farm polygon shapefile data from a zip archive."""
+# cache_resource: the GeoDataFrame's Shapely geometries are costly to hash and pickle on every hit
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_map_data(map_mtime):
+    """Loads the farm polygons from a zip archive, with their sorted IDs, row positions and All Farms GeoJSON.
+
+    `map_mtime` only keys the cache.
+    """
+    # Imported here so the geo stack (shapely, pyproj, pyogrio) loads only once Tab 3 is reached
+    import geopandas as gpd
     # This function will now raise an exception on failure, which will be caught below.
-    gdf = gpd.read_file("zip://Polygons_Shapefile.zip")
+    gdf = gpd.read_file(f"zip://{MAP_ZIP_PATH}")
     if 'What_is_th' not in gdf.columns:
         raise KeyError("Shapefile error: Must contain a column named 'What_is_th'.")
-    return gdf
+    # Reproject once here for Folium (WGS 84) instead of on every farm selection
+    gdf = gdf.to_crs(epsg=4326)
+    # Per-farm bounds as plain float columns, so zooming to a selection needs no geometry scan
+    farm_bounds = gdf.bounds
+    for bound in ('minx', 'miny', 'maxx', 'maxy'):
+        gdf[f'_{bound}'] = farm_bounds[bound].to_numpy()
+    # Thin the rendered outlines; pointwise rounding leaves the (sometimes invalid) rings untouched
+    gdf['geometry'] = gdf.geometry.simplify(MAP_SIMPLIFY_TOLERANCE, preserve_topology=True).set_precision(
+        MAP_COORDINATE_PRECISION, mode='pointwise'
+    )
+    # Sorted once here rather than on every render of the farm search box
+    farm_ids = tuple(sorted(gdf['What_is_th'].unique().tolist()))
+    # Row positions per farm ID, so selecting a farm is a dict lookup instead of a column scan
+    farm_rows = gdf.groupby('What_is_th').indices
+    # The "All Farms" layer is the same every run, so its GeoJSON is serialized once here
+    all_farms_geojson = gdf[['What_is_th', 'geometry']].to_json(drop_id=True)
+    # Parsed once as well, for the pydeck layer, which takes the feature collection as a dict
+    all_farms_features = json.loads(all_farms_geojson)
+    return gdf, farm_ids, farm_rows, all_farms_geojson, all_farms_features
+
+
+# --- FILTER & AGGREGATION FUNCTIONS ---
+def resolve_active_villages(village_type, selected_village):
+    """Returns the villages matching the sidebar selection, or None if no village filter applies."""
+    if village_type == 'All' and selected_village == 'All':
+        return None
+    if village_type == 'Certified Villages':
+        active_village_list = CERTIFIED_VILLAGES_SET
+    elif village_type == 'Project Villages':
+        active_village_list = PROJECT_VILLAGES_SET
+    else:
+        active_village_list = ALL_VILLAGES
+    if selected_village != 'All':
+        active_village_list = [v for v in active_village_list if v == selected_village]
+    return active_village_list
+
+@st.cache_data(show_spinner=False, max_entries=SELECTION_CACHE_ENTRIES)
+def compute_views(_survey_cube, survey_version, start_date, end_date, village_type, selected_village):
+    """Filters the survey cube to the current selection and builds the Tab 1 summaries.
+
+    The cube itself is not hashed (leading underscore); `survey_version` ties the cache to the loaded data.
+    """
+    active_village_list = resolve_active_villages(village_type, selected_village)
+    lo = _survey_cube['Day'].searchsorted(start_date, side='left')
+    hi = _survey_cube['Day'].searchsorted(end_date, side='right')
+    cube_in_range = _survey_cube.iloc[lo:hi]
+    if active_village_list is not None:
+        cube_filtered = cube_in_range[cube_in_range['Village'].isin(active_village_list)]
+    else:
+        cube_filtered = cube_in_range
 
+    running = _survey_cube['Running'].to_numpy()
+    total_achieved_in_date_range = int((running[hi - 1] if hi else 0) - (running[lo - 1] if lo else 0))
 
-# --- LOAD ALL DATA INTO SESSION STATE WITH ROBUST ERROR HANDLING ---
-if 'survey_data' not in st.session_state:
-    try:
-        st.session_state.survey_data = load_survey_data()
-        st.session_state.survey_error = None
-    except Exception as e:
-        st.session_state.survey_data = None
-        st.session_state.survey_error = e
+    # observed=False yields every village category, with 0 for villages without surveys
+    village_summary = (
+        cube_filtered.groupby('Village', observed=False)['Count'].sum().rename('Achieved').reset_index()
+    )
+    village_summary.insert(1, 'Type', village_summary['Village'].map(VILLAGE_TYPE_MAP))
+    if village_type == 'Certified Villages':
+        village_summary = village_summary[village_summary['Type'] == 'Certified'].reset_index(drop=True)
+    elif village_type == 'Project Villages':
+        village_summary = village_summary[village_summary['Type'] == 'Project'].reset_index(drop=True)
+
+    # Days stay datetime64 and come out of the groupby already sorted
+    surveys_per_day = (
+        cube_filtered.groupby('Day', sort=True)['Count'].sum().rename_axis('Date').reset_index(name='Count')
+    )
+    surveys_per_day['Cumulative'] = surveys_per_day['Count'].to_numpy().cumsum()
+    total_achieved_in_selection = int(surveys_per_day['Cumulative'].iloc[-1]) if len(surveys_per_day) else 0
+
+    return total_achieved_in_date_range, total_achieved_in_selection, village_summary, surveys_per_day
+
+
+# --- CHART FUNCTIONS ---
+# Figures are cached on the small summary frames, so reruns that leave the selection
+# unchanged reuse the built figure instead of redoing Plotly's trace conversion
+@st.cache_data(show_spinner=False, max_entries=SELECTION_CACHE_ENTRIES)
+def make_daily_bar(surveys_per_day):
+    """Builds the survey volume bar chart, switching to weekly bars for long date ranges."""
+    if len(surveys_per_day) > MAX_DAILY_BARS:
+        bar_data = surveys_per_day.resample('W', on='Date')['Count'].sum().reset_index()
+        bar_title, bar_period = 'Weekly Survey Volume', 'Week'
+    else:
+        bar_data = surveys_per_day
+        bar_title, bar_period = 'Daily Survey Volume', 'Day'
+    fig_bars = px.bar(bar_data, x='Date', y='Count', title=bar_title,
+                      labels={'Date': bar_period, 'Count': 'No. of Surveys'},
+                      color_discrete_sequence=['rgb(218, 48, 44)'])
+    fig_bars.update_xaxes(tickformat="%Y-%m-%d")
+    fig_bars.update_layout(title_x=0.5)
+    return fig_bars
+
+@st.cache_data(show_spinner=False, max_entries=SELECTION_CACHE_ENTRIES)
+def make_cumulative_line(surveys_per_day):
+    """Builds the cumulative progress line, downsampling long series."""
+    line_data = surveys_per_day
+    if len(line_data) > MAX_LINE_POINTS:
+        keep = MinMaxLTTBDownsampler().downsample(
+            line_data['Date'].to_numpy().astype('datetime64[ns]').view('i8'),
+            line_data['Cumulative'].to_numpy(),
+            n_out=LINE_DOWNSAMPLE_POINTS
+        )
+        line_data = line_data.iloc[keep]
+    # WebGL trace: stays responsive as the number of days grows, unlike an SVG line
+    fig_line = go.Figure(go.Scattergl(
+        x=line_data['Date'], y=line_data['Cumulative'], mode='lines+markers',
+        line=dict(color='rgb(125, 217, 186)'),
+        hovertemplate='Day=%{x|%Y-%m-%d}<br>Cumulative Total=%{y}<extra></extra>'
+    ))
+    fig_line.update_xaxes(tickformat="%Y-%m-%d", title_text='Day')
+    fig_line.update_yaxes(title_text='Cumulative Total')
+    fig_line.update_layout(title='Cumulative Survey Growth', title_x=0.5)
+    return fig_line
+
+@st.cache_data(show_spinner=False, max_entries=SELECTION_CACHE_ENTRIES)
+def make_land_use_bar(frequency):
+    """Builds the land use frequency bar chart."""
+    fig_land_use = px.bar(
+        frequency, x='Land Use Type', y='Number of Points',
+        title='Frequency of Land Use Types',
+        labels={'Land Use Type': 'Type of Land Use', 'Number of Points': 'Count of GPS Points'},
+        color_discrete_sequence=['rgb(218, 48, 44)']
+    )
+    fig_land_use.update_layout(title_x=0.5)
+    return fig_land_use
+
+
+# --- PAGE FRAGMENTS ---
+# Widgets inside a fragment rerun only the fragment, so they don't recompute the rest of the page.
+# The sidebar filters stay outside: fragments can't write to the sidebar
+@st.fragment
+def render_raw_data(survey_version, start_date, end_date, village_type, selected_village):
+    """Renders the filtered raw survey rows and their CSV download."""
+    # The expander body always runs, so the checkbox keeps the row filtering and the
+    # table serialization off the rerun path until someone asks for the raw data
+    if st.checkbox("Show raw data", key="show_raw_data"):
+        # Zero-copy nanosecond view of the sorted dates, so the bounds are found on plain int64s
+        survey_dates = load_survey_data(survey_version)['Date'].to_numpy()
+        survey_date_i8 = survey_dates.astype('datetime64[ns]', copy=False).view('i8')
+        lo = survey_date_i8.searchsorted(start_date.astype(np.int64), side='left')
+        hi = survey_date_i8.searchsorted(end_date.astype(np.int64), side='right')
+        # Same sorted row order as df_raw, so the date slice lines up with the full frame
+        df_filtered = load_survey_data(survey_version, columns=None).iloc[lo:hi]
+        row_mask = load_village_type_masks(survey_version).get(village_type)
+        if row_mask is not None:
+            row_mask = row_mask[lo:hi]
+        if selected_village != 'All':
+            # Categorical equality compares integer codes
+            is_selected = (df_filtered['Village'] == selected_village).to_numpy()
+            row_mask = is_selected if row_mask is None else row_mask & is_selected
+        if row_mask is not None:
+            df_filtered = df_filtered[row_mask]
+        if len(df_filtered) > RAW_DATA_PREVIEW_ROWS:
+            st.caption(
+                f"Showing the first {RAW_DATA_PREVIEW_ROWS:,} of {len(df_filtered):,} rows. "
+                "Download the CSV for all of them."
+            )
+        st.dataframe(df_filtered.head(RAW_DATA_PREVIEW_ROWS))
+        st.download_button(
+            "Download filtered data as CSV",
+            df_filtered.to_csv(index=False).encode('utf-8'),
+            file_name='filtered_raw_data.csv',
+            mime='text/csv'
+        )
 
-if 'gps_data' not in st.session_state:
-    st.session_state.gps_data = load_gps_data()
+@st.fragment
+def render_farm_map(gdf_farms, farm_ids, farm_rows, all_farms_geojson, all_farms_features):
+    """Renders the farm search box and the polygon map."""
+    # Deferred like geopandas in load_map_data: Tabs 1 and 2 are sent before these load
+    import folium
+    import pydeck as pdk
+    from streamlit_folium import st_folium
 
-if 'map_data' not in st.session_state:
     try:
-        st.session_state.map_data = load_map_data()
-        st.session_state.map_error = None
+        # --- NEW: Add a search box for farms ---
+        farm_id_list = ('All Farms',) + farm_ids
+        selected_farm_id = st.selectbox("Search for a Farm ID to zoom in:", farm_id_list)
+
+        # Filter the data based on the selection
+        if selected_farm_id == 'All Farms':
+            gdf_to_display = gdf_farms
+        else:
+            gdf_to_display = gdf_farms.iloc[farm_rows[selected_farm_id]]
+
+        # Calculate the center for the map view from the precomputed farm bounds
+        center_lat = (gdf_to_display['_miny'].min() + gdf_to_display['_maxy'].max()) / 2
+        center_lon = (gdf_to_display['_minx'].min() + gdf_to_display['_maxx'].max()) / 2
+
+        # Determine the appropriate zoom level
+        zoom_level = 12 if selected_farm_id == 'All Farms' else 16
+
+        if len(gdf_to_display) > MAX_FOLIUM_POLYGONS:
+            if selected_farm_id == 'All Farms':
+                farm_features = all_farms_features
+            else:
+                farm_features = gdf_to_display[['What_is_th', 'geometry']].__geo_interface__
+            farm_layer = pdk.Layer(
+                'GeoJsonLayer',
+                data=farm_features,
+                get_fill_color=[218, 48, 44, 255],  # Laterite Dark Red
+                get_line_color=[255, 255, 255],
+                line_width_min_pixels=2,
+                pickable=True,
+                auto_highlight=True
+            )
+            st.pydeck_chart(
+                pdk.Deck(
+                    layers=[farm_layer],
+                    initial_view_state=pdk.ViewState(latitude=center_lat, longitude=center_lon, zoom=zoom_level),
+                    tooltip={'text': 'Farm ID: {What_is_th}'}
+                ),
+                use_container_width=True,
+                height=600
+            )
+        else:
+            # Create a base map centered on the data
+            m = folium.Map(location=[center_lat, center_lon], zoom_start=zoom_level, tiles=None, control_scale=True)
+            
+            folium.TileLayer(
+                tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
+                attr='Esri', name='Esri Satellite', overlay=False, control=True
+            ).add_to(m)
+            
+            # --- NEW: Define improved styling and highlight functions ---
+            style_function = lambda x: {
+                'fillColor': '#DA302C', # Laterite Dark Red
+                'color': '#FFFFFF',     # White
+                'weight': 3,
+                'fillOpacity': 1.0      # Not transparent
+            }
+            highlight_function = lambda x: {
+                'fillColor': '#DA302C', # Laterite Dark Red
+                'color': '#FFFFFF',
+                'weight': 5,            # Thicker border on hover
+                'fillOpacity': 1.0      # Still not transparent
+            }
+
+            # The bounds columns are only for centering; keep them out of the GeoJSON sent to the browser
+            if selected_farm_id == 'All Farms':
+                farm_geojson = all_farms_geojson
+            else:
+                farm_geojson = gdf_to_display[['What_is_th', 'geometry']]
+            folium.GeoJson(
+                farm_geojson,
+                tooltip=folium.features.GeoJsonTooltip(
+                    fields=['What_is_th'],
+                    aliases=['Farm ID:'],
+                    sticky=True
+                ),
+                style_function=style_function,
+                highlight_function=highlight_function
+            ).add_to(m)
+            
+            st_folium(m, use_container_width=True, height=600)
+
     except Exception as e:
-        st.session_state.map_data = None
-        st.session_state.map_error = e
+        st.error(f"An error occurred during map creation: {e}")
+
 
-df_raw = st.session_state.survey_data
-df_gps = st.session_state.gps_data
-gdf_farms = st.session_state.map_data
+# --- LOAD ALL DATA WITH ROBUST ERROR HANDLING ---
+# Every loader is cached per server process and keyed on its file's modification time,
+# so replacing a file reloads it on the next run. Failed loads are not cached.
+try:
+    survey_version = os.path.getmtime(SURVEY_CSV_PATH)
+    df_raw = load_survey_data(survey_version)
+    survey_cube = load_survey_cube(survey_version)
+    survey_error = None
+except Exception as e:
+    df_raw = survey_cube = survey_version = None
+    survey_error = e
+
+df_gps = load_gps_data(file_mtime(GPS_CSV_PATH))
 
 # --- ROBUSTNESS CHECK: Ensure survey data is valid before proceeding ---
-if st.session_state.survey_error:
-    st.error(f"CRITICAL ERROR LOADING SURVEY DATA: {st.session_state.survey_error}")
+if survey_error:
+    st.error(f"CRITICAL ERROR LOADING SURVEY DATA: {survey_error}")
     st.stop()
 if df_raw is None or df_raw.empty:
     st.error("CRITICAL ERROR: 'Raw_data.csv' file is empty or has no valid dates. Please check the file.")
@@ -135,7 +544,9 @@ if df_raw is None or df_raw.empty:
 
 
 # --- BRANDED HEADER ---
-last_update_date = df_raw['Date'].max().strftime("%B %d, %Y")
+# df_raw is sorted by date, so its first and last rows give the date range directly
+min_date, max_date = df_raw['Date'].iloc[0], df_raw['Date'].iloc[-1]
+last_update_date = max_date.strftime("%B %d, %Y")
 header_col1, header_col2 = st.columns(2)
 with header_col1:
     st.title("Thriving Landscapes San Martin")
@@ -165,11 +576,7 @@ with tab1:
         "Select Village Type:",
         ('All', 'Certified Villages', 'Project Villages')
     )
-    village_list = ['All'] + ALL_VILLAGES
-    selected_village = st.sidebar.selectbox("Select Individual Village:", village_list)
-    
-    min_date = df_raw['Date'].min()
-    max_date = df_raw['Date'].max()
+    selected_village = st.sidebar.selectbox("Select Individual Village:", VILLAGE_OPTIONS)
     
     selected_dates = st.sidebar.date_input(
         "Select Date Range:",
@@ -179,23 +586,17 @@ with tab1:
     )
 
     if not selected_dates or len(selected_dates) != 2:
-        start_date, end_date = min_date, max_date
+        first_day, last_day = min_date, max_date
         st.sidebar.warning("Invalid date range selected. Showing data for all dates.")
     else:
-        start_date, end_date = pd.to_datetime(selected_dates[0]), pd.to_datetime(selected_dates[1])
-
-    overall_progress_df = df_raw[(df_raw['Date'] >= start_date) & (df_raw['Date'] <= end_date)]
-    df_filtered = overall_progress_df.copy()
-
-    if village_type == 'Certified Villages':
-        df_filtered = df_filtered[df_filtered['Village'].isin(CERTIFIED_VILLAGES)]
-    elif village_type == 'Project Villages':
-        df_filtered = df_filtered[df_filtered['Village'].isin(PROJECT_VILLAGES)]
-    if selected_village != 'All':
-        df_filtered = df_filtered[df_filtered['Village'] == selected_village]
+        first_day, last_day = selected_dates
+    # Nanosecond bounds covering the whole first and last selected days
+    start_date = np.datetime64(first_day, 'D').astype('datetime64[ns]')
+    end_date = np.datetime64(last_day, 'D') + np.timedelta64(1, 'D') - np.timedelta64(1, 'ns')
 
-    total_achieved_in_date_range = len(overall_progress_df)
-    total_achieved_in_selection = len(df_filtered)
+    total_achieved_in_date_range, total_achieved_in_selection, village_summary, surveys_per_day = compute_views(
+        survey_cube, survey_version, start_date, end_date, village_type, selected_village
+    )
     percentage_achieved = (total_achieved_in_date_range / OVERALL_TARGET) if OVERALL_TARGET > 0 else 0
 
     st.header("Overall Summary")
@@ -208,43 +609,19 @@ with tab1:
     st.metric("Surveys in Selection", f"{total_achieved_in_selection:,}")
 
     st.header("Progress by Village")
-    progress_by_village = df_filtered.groupby('Village').size().reset_index(name='Achieved')
-    village_type_map = {village: 'Certified' for village in CERTIFIED_VILLAGES}
-    village_type_map.update({village: 'Project' for village in PROJECT_VILLAGES})
-    df_all_villages = pd.DataFrame(list(village_type_map.items()), columns=['Village', 'Type'])
-    if village_type == 'Certified Villages':
-        df_all_villages = df_all_villages[df_all_villages['Type'] == 'Certified']
-    elif village_type == 'Project Villages':
-        df_all_villages = df_all_villages[df_all_villages['Type'] == 'Project']
-    village_summary = pd.merge(df_all_villages, progress_by_village, on='Village', how='left')
-    village_summary['Achieved'] = village_summary['Achieved'].fillna(0).astype(int)
     st.dataframe(village_summary.style.format({'Achieved': '{:,}'}), use_container_width=True)
 
     st.header("Trend Analysis")
     col_graph1, col_graph2 = st.columns(2)
     with col_graph1:
         st.subheader("Surveys Completed per Day")
-        surveys_per_day = df_filtered.groupby(df_filtered['Date'].dt.date).size().reset_index(name='Count')
-        fig_bars = px.bar(surveys_per_day, x='Date', y='Count', title='Daily Survey Volume',
-                          labels={'Date': 'Day', 'Count': 'No. of Surveys'},
-                          color_discrete_sequence=['rgb(218, 48, 44)'])
-        fig_bars.update_xaxes(tickformat="%Y-%m-%d")
-        fig_bars.update_layout(title_x=0.5)
-        st.plotly_chart(fig_bars, use_container_width=True)
+        st.plotly_chart(make_daily_bar(surveys_per_day), use_container_width=True)
     with col_graph2:
         st.subheader("Cumulative Progress Over Time")
-        surveys_per_day = surveys_per_day.sort_values('Date')
-        surveys_per_day['Cumulative'] = surveys_per_day['Count'].cumsum()
-        fig_line = px.line(surveys_per_day, x='Date', y='Cumulative', title='Cumulative Survey Growth',
-                           labels={'Date': 'Day', 'Cumulative': 'Cumulative Total'},
-                           color_discrete_sequence=['rgb(125, 217, 186)'])
-        fig_line.update_xaxes(tickformat="%Y-%m-%d")
-        fig_line.update_traces(mode='lines+markers')
-        fig_line.update_layout(title_x=0.5)
-        st.plotly_chart(fig_line, use_container_width=True)
+        st.plotly_chart(make_cumulative_line(surveys_per_day), use_container_width=True)
 
     with st.expander("View filtered raw data"):
-        st.dataframe(df_filtered)
+        render_raw_data(survey_version, start_date, end_date, village_type, selected_village)
 
 # --- TAB 2: LAND USE ANALYSIS ---
 with tab2:
@@ -252,82 +629,29 @@ with tab2:
     if df_gps is not None:
         frequency = df_gps['Land Use Type'].value_counts().reset_index()
         frequency.columns = ['Land Use Type', 'Number of Points']
-        fig_land_use = px.bar(
-            frequency, x='Land Use Type', y='Number of Points',
-            title='Frequency of Land Use Types',
-            labels={'Land Use Type': 'Type of Land Use', 'Number of Points': 'Count of GPS Points'},
-            color_discrete_sequence=['rgb(218, 48, 44)']
-        )
-        fig_land_use.update_layout(title_x=0.5)
-        st.plotly_chart(fig_land_use, use_container_width=True)
+        if len(frequency) > MAX_LAND_USE_TYPES:
+            st.caption(f"Showing the {MAX_LAND_USE_TYPES} most frequent of {len(frequency)} land use types.")
+            frequency = frequency.nlargest(MAX_LAND_USE_TYPES, 'Number of Points')
+        st.plotly_chart(make_land_use_bar(frequency), use_container_width=True)
     else:
         st.warning("Warning: 'gps_raw.csv' file not found. Please add it to your project folder to see this analysis.")
 
 # --- TAB 3: FARM POLYGONS MAP ---
 with tab3:
     st.header("Map of Farm Polygons")
-    if 'map_error' in st.session_state and st.session_state.map_error is not None:
-        st.error(f"A technical error occurred while loading the shapefile: {st.session_state.map_error}")
+    # Loaded inside the tab so the shapefile and its imports come after Tabs 1 and 2 have rendered
+    try:
+        gdf_farms, farm_ids, farm_rows, all_farms_geojson, all_farms_features = load_map_data(
+            file_mtime(MAP_ZIP_PATH)
+        )
+        map_error = None
+    except Exception as e:
+        gdf_farms = farm_ids = farm_rows = all_farms_geojson = all_farms_features = None
+        map_error = e
+    if map_error is not None:
+        st.error(f"A technical error occurred while loading the shapefile: {map_error}")
     elif gdf_farms is not None and not gdf_farms.empty:
-        try:
-            # --- NEW: Add a search box for farms ---
-            farm_id_list = ['All Farms'] + sorted(gdf_farms['What_is_th'].unique().tolist())
-            selected_farm_id = st.selectbox("Search for a Farm ID to zoom in:", farm_id_list)
-
-            # Filter the data based on the selection
-            if selected_farm_id == 'All Farms':
-                gdf_to_display = gdf_farms
-            else:
-                gdf_to_display = gdf_farms[gdf_farms['What_is_th'] == selected_farm_id]
-
-            # Ensure the GeoDataFrame is in the correct CRS for Folium (WGS 84)
-            gdf_4326 = gdf_to_display.to_crs(epsg=4326)
-
-            # Calculate the center for the map view
-            bounds = gdf_4326.total_bounds
-            center_lat = (bounds[1] + bounds[3]) / 2
-            center_lon = (bounds[0] + bounds[2]) / 2
-
-            # Determine the appropriate zoom level
-            zoom_level = 12 if selected_farm_id == 'All Farms' else 16
-
-            # Create a base map centered on the data
-            m = folium.Map(location=[center_lat, center_lon], zoom_start=zoom_level, tiles=None, control_scale=True)
-            
-            folium.TileLayer(
-                tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
-                attr='Esri', name='Esri Satellite', overlay=False, control=True
-            ).add_to(m)
-            
-            # --- NEW: Define improved styling and highlight functions ---
-            style_function = lambda x: {
-                'fillColor': '#DA302C', # Laterite Dark Red
-                'color': '#FFFFFF',     # White
-                'weight': 3,
-                'fillOpacity': 1.0      # Not transparent
-            }
-            highlight_function = lambda x: {
-                'fillColor': '#DA302C', # Laterite Dark Red
-                'color': '#FFFFFF',
-                'weight': 5,            # Thicker border on hover
-                'fillOpacity': 1.0      # Still not transparent
-            }
-
-            folium.GeoJson(
-                gdf_4326,
-                tooltip=folium.features.GeoJsonTooltip(
-                    fields=['What_is_th'],
-                    aliases=['Farm ID:'],
-                    sticky=True
-                ),
-                style_function=style_function,
-                highlight_function=highlight_function
-            ).add_to(m)
-            
-            st_folium(m, use_container_width=True, height=600)
-
-        except Exception as e:
-            st.error(f"An error occurred during map creation: {e}")
+        render_farm_map(gdf_farms, farm_ids, farm_rows, all_farms_geojson, all_farms_features)
 
     else:
         st.warning("Could not load map data. Please check the 'Polygons_Shapefile.zip' file.")
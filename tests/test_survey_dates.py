@@ -0,0 +1,70 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+DASHBOARD_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dashboard.py')
+
+
+class SurveyDateParsingTest(unittest.TestCase):
+    """Runs the dashboard against a one-off Raw_data.csv and checks every survey row is kept."""
+
+    def setUp(self):
+        self.previous_dir = os.getcwd()
+        self.work_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.work_dir.name)
+        # The loaders are keyed on the CSV mtime only, so clear anything left by an earlier test
+        st.cache_data.clear()
+        st.cache_resource.clear()
+
+    def tearDown(self):
+        os.chdir(self.previous_dir)
+        self.work_dir.cleanup()
+
+    def run_dashboard(self, csv_text):
+        with open('Raw_data.csv', 'w') as f:
+            f.write(csv_text)
+        at = AppTest.from_file(DASHBOARD_PATH, default_timeout=120)
+        at.secrets['PASSWORD'] = 'test'
+        at.session_state['password_correct'] = True
+        return at.run()
+
+    def assert_surveys_loaded(self, at, count, first_day, last_day):
+        self.assertFalse(at.exception)
+        self.assertFalse([e.value for e in at.error if 'SURVEY' in e.value or 'CRITICAL' in e.value])
+        metrics = {m.label: m.value for m in at.metric}
+        self.assertEqual(metrics['Total Achieved (in date range)'], str(count))
+        self.assertEqual(at.sidebar.date_input[0].value, (first_day, last_day))
+
+    def test_dates_with_time_of_day(self):
+        at = self.run_dashboard(
+            'today,village\n'
+            '7/21/2025 10:30,ALTO ANDINO\n'
+            '7/22/2025 09:15,HUICUNGO\n'
+            '7/23/2025 16:45,SAN JUAN\n'
+        )
+        self.assert_surveys_loaded(at, 3, datetime.date(2025, 7, 21), datetime.date(2025, 7, 23))
+
+    def test_format_outside_the_explicit_list(self):
+        at = self.run_dashboard(
+            'today,village\n'
+            '21.07.2025,ALTO ANDINO\n'
+            '22.07.2025,HUICUNGO\n'
+            '23.07.2025,SAN JUAN\n'
+        )
+        self.assert_surveys_loaded(at, 3, datetime.date(2025, 7, 21), datetime.date(2025, 7, 23))
+
+    def test_listed_format_is_read_exactly(self):
+        at = self.run_dashboard(
+            'today,village\n'
+            '7/21/2025,ALTO ANDINO\n'
+            '7/22/2025,HUICUNGO\n'
+        )
+        self.assert_surveys_loaded(at, 2, datetime.date(2025, 7, 21), datetime.date(2025, 7, 22))
+
+
+if __name__ == '__main__':
+    unittest.main()